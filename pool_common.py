@@ -0,0 +1,374 @@
+"""Shared constants and helpers for the pool estimator.
+
+Everything that is not Streamlit UI lives here so app.py stays a thin page
+script and the tables/regexes/clients are constructed exactly once per
+import regardless of how many entry points use them.
+"""
+
+import streamlit as st
+import googlemaps
+import math
+import numpy as np
+import re
+import sqlite3
+import time
+from functools import lru_cache
+from types import MappingProxyType
+from fpdf import FPDF
+import smtplib
+from email.message import EmailMessage
+from streamlit.runtime.scriptrunner import StopException
+
+try:
+    import ahocorasick  # optional; accelerates the permit-city scan
+except ImportError:
+    ahocorasick = None
+
+# Google Maps client built lazily and shared across sessions; constructing
+# it at import time would pay client setup on every worker restart even for
+# users who never submit.
+@st.cache_resource(show_spinner=False)
+def _gmaps():
+    try:
+        return googlemaps.Client(key=st.secrets["googlemaps"]["api_key"])
+    except Exception as e:
+        st.error(f"Google Maps is not configured ({e}). Add the API key under [googlemaps] in secrets.toml.")
+        st.stop()
+
+# ─── Constants ──────────────────────────────────────────────────────────
+
+# (category, difficulty) -> (Excavation, Pool Work, Liner); flat so the
+# submit branch does one dict lookup instead of two.
+COST_TABLE = {
+    ('Small', 'Easy'): (3791, 5391, 1178),
+    ('Small', 'Moderate'): (4140, 6860, 1178),
+    ('Small', 'Difficult'): (4488, 8269, 1535),
+    ('Medium', 'Easy'): (3132, 5391, 1608),
+    ('Medium', 'Moderate'): (4140, 7890, 1981),
+    ('Medium', 'Difficult'): (4894, 10842, 2354),
+    ('Large', 'Easy'): (7016, 7935, 1567),
+    ('Large', 'Moderate'): (7016, 7935, 1567),
+    ('Large', 'Difficult'): (7016, 7935, 1567)
+}
+
+# Constant tables are frozen with MappingProxyType: they are read-only by
+# design and safe for Streamlit's caching layer to hash.
+INSTALL_COST = MappingProxyType({'Small': 281.69, 'Medium': 388.49, 'Large': 495.29})
+
+PERMIT_COSTS = {
+    'burlington': 1000, 'oakville': 1000,
+    'mississauga': 500, 'toronto': 500, 'brampton': 500,
+    'etobicoke': 500, 'hamilton': 500
+}
+
+FIXED_COSTS = MappingProxyType({
+    'Plumbing': 1800.00,
+    'Filter': 1192.50,
+    'SaltSystem': 1348.35 + 100.00,  # + $100 for salt
+    'Transformer': 140.33,
+    'DrainKit': 362.80,
+    'WinterCoverLabour': 300.00
+})
+
+# Fixed line items hoisted once at import; the invariant part of the total
+# is pre-summed so the submit branch only adds the variable terms.
+_PLUMBING = FIXED_COSTS['Plumbing']
+_FILTER = FIXED_COSTS['Filter']
+_SALT_SYSTEM = FIXED_COSTS['SaltSystem']
+_TRANSFORMER = FIXED_COSTS['Transformer']
+_DRAIN_KIT = FIXED_COSTS['DrainKit']
+_WINTER_LABOUR = FIXED_COSTS['WinterCoverLabour']
+_FIXED_SUM = _PLUMBING + _FILTER + _SALT_SYSTEM + _DRAIN_KIT + _WINTER_LABOUR
+
+PUMP_OPTIONS = MappingProxyType({
+    "Jandy VSFHP165AUT, VS FloPro Variable Speed Pump W/O JEP-R": 1217.14,
+    "Jandy VS FloPro 1.65 HP Variable-Speed Pump, 115/230 VAC, w/SpeedSet Control": 1490.69,
+    "Jandy VS FloPro 1.85 HP Variable-Speed Pump 115/230 VAC, 2 AUX Relays": 1380.21,
+    "Jandy VS FloPro 2.7 HP Variable-Speed Pump, 115/230 Vac, 2 Aux Relays, w/o": 1870.46,
+})
+
+HEATER_OPTIONS = MappingProxyType({
+    "Jandy JXIQ Pool Heater, 200, Natural Gas, Copper Hx, Versaflo, Poly Header": 3067.73,
+    "Jandy JXI Pool Heater 200 Propane/ Natural": 2718.61,
+    "Jandy JXIQ Pool Heater, 260, Natural Gas, Copper Hx, Versaflo, Poly Header": 3294.29,
+    "Jandy JXI Pool Heater 260 Propane/ Natural": 2936.09,
+    "Jandy JXIQ Pool Heater, 400, Natural Gas, Copper Hx, Versaflo, Poly Header": 3549.77,
+    "Jandy JXI Pool Heater 400 Natural/ Propane": 3212.75,
+})
+
+# Option lists built once: st.selectbox re-runs on every widget interaction,
+# so list(...) there would allocate per rerun.
+PUMP_KEYS = tuple(PUMP_OPTIONS)
+HEATER_KEYS = tuple(HEATER_OPTIONS)
+
+# Rate tables for the radio options: one dict lookup instead of a string
+# comparison, and a new tracking type is a one-line data change.
+_TRACK_RATE = MappingProxyType({"Side Mount Single Track": 4.27, "Bullnose Single Track": 8.39})
+TRACK_KEYS = tuple(_TRACK_RATE)
+_STEP_EXTRA = MappingProxyType({"Yes": 0.0, "No": 300.0})
+
+# Per-linear-foot and per-square-foot rate vectors: one vectorized multiply
+# per input yields (HPB, steel, liner-extra) and (concrete, softbottom,
+# winter cover area) in a single operation each.
+_LF_COEF = np.array([7.25, 50.0, 22.12])
+_SQFT_COEF = np.array([5.25, 0.50, 3.50])
+
+# ─── Helper Functions ───────────────────────────────────────────────────
+
+# Regexes compiled once at module load instead of per call.
+_SANITIZE_RE = re.compile(r'[^\w\s]')
+_CITY_RE = re.compile(r'([\w\s\-]+?),\s*(ON|Ontario)', re.IGNORECASE)
+# One compiled alternation over the permit cities: a single scan of the
+# address instead of a substring test per PERMIT_COSTS key.
+_PERMIT_RE = re.compile(r'\b(' + '|'.join(map(re.escape, PERMIT_COSTS)) + r')\b', re.IGNORECASE)
+
+# With pyahocorasick installed the scan is a single automaton pass whose
+# cost stays flat no matter how many municipalities PERMIT_COSTS grows to;
+# the alternation regex above remains the fallback.
+if ahocorasick is not None:
+    _PERMIT_AUTOMATON = ahocorasick.Automaton()
+    for _city, _cost in PERMIT_COSTS.items():
+        _PERMIT_AUTOMATON.add_word(_city, (_city, _cost))
+    _PERMIT_AUTOMATON.make_automaton()
+else:
+    _PERMIT_AUTOMATON = None
+
+def _is_word_boundary(text: str, index: int) -> bool:
+    # Mirrors the regex \b: off either end of the text, or a non-\w char.
+    if index < 0 or index >= len(text):
+        return True
+    ch = text[index]
+    return not (ch.isalnum() or ch == '_')
+
+def sanitize_filename(address: str) -> str:
+    clean = _SANITIZE_RE.sub('', address)
+    return "_".join(clean.strip().split())
+
+@lru_cache(maxsize=256)
+def get_city(address: str) -> str:
+    match = _CITY_RE.search(address)
+    return match.group(1).strip().lower() if match else ''
+
+def get_permit_cost(address: str) -> float:
+    # Match against the extracted city, not the whole address: street names
+    # like "Burlington St" or "Toronto Street" must not set the permit fee.
+    city = get_city(address)
+    if _PERMIT_AUTOMATON is not None:
+        for end, (key, cost) in _PERMIT_AUTOMATON.iter(city):
+            # Whole words only, matching the \b in the regex fallback.
+            if _is_word_boundary(city, end - len(key)) and _is_word_boundary(city, end + 1):
+                return cost
+        return 0
+    match = _PERMIT_RE.search(city)
+    return PERMIT_COSTS[match.group(1)] if match else 0
+
+# Difficulty by score - 1, where score = dist_factor * acc_factor takes the
+# values 1, 2, 3, 4 or 6; everything past Moderate is Difficult.
+_DIFF = ("Easy", "Moderate", "Difficult", "Difficult", "Difficult", "Difficult")
+
+def calculate_difficulty(distance_ft, access_in):
+    dist_factor = 1 + (distance_ft > 70) + (distance_ft > 120)
+    acc_factor = 2 - (access_in >= 70)
+    return _DIFF[dist_factor * acc_factor - 1]
+
+# Persistent distance cache: Streamlit's in-memory cache is wiped on every
+# restart, so repeat addresses would keep paying the Distance Matrix API call.
+_DM_CACHE_PATH = "distance_cache.db"
+_DM_CACHE_TTL = 30 * 24 * 3600  # refresh entries older than 30 days
+
+@st.cache_resource(show_spinner=False)
+def _dm_cache():
+    conn = sqlite3.connect(_DM_CACHE_PATH, check_same_thread=False)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS dm("
+        "origin TEXT, dest TEXT, km REAL, hrs REAL, ts INTEGER, "
+        "PRIMARY KEY(origin, dest))"
+    )
+    conn.commit()
+    return conn
+
+_ORIGIN_ADDRESS = "5491 Appleby Line, Burlington, ON"
+
+@st.cache_resource(show_spinner=False)
+def _origin_latlng():
+    # Resolve the shop address to lat/lng once; passing coordinates to the
+    # Distance Matrix API skips re-geocoding the constant origin per request.
+    try:
+        return _gmaps().geocode(_ORIGIN_ADDRESS)[0]['geometry']['location']
+    except StopException:
+        # st.stop() from the unconfigured client must halt the run, not
+        # degrade into an estimate with a silently wrong drive cost.
+        raise
+    except Exception:
+        return _ORIGIN_ADDRESS
+
+def _normalize_address(address) -> str:
+    clean = _SANITIZE_RE.sub('', str(address))
+    return " ".join(clean.lower().split())
+
+@st.cache_data(show_spinner=False)
+def get_drive_km_and_time(origin, destination):
+    try:
+        if not destination.strip():
+            return 0, 0
+        origin_key = _normalize_address(origin)
+        dest_key = _normalize_address(destination)
+        conn = _dm_cache()
+        row = conn.execute(
+            "SELECT km, hrs FROM dm WHERE origin=? AND dest=? AND ts>?",
+            (origin_key, dest_key, int(time.time()) - _DM_CACHE_TTL)
+        ).fetchone()
+        if row:
+            return row[0], row[1]
+        result = _gmaps().distance_matrix(origins=origin, destinations=destination, mode="driving", units="metric", region="ca")
+        element = result['rows'][0]['elements'][0]
+        if element['status'] != 'OK':
+            st.warning(f"Google Distance Matrix API returned status: {element['status']}")
+            return 0, 0
+        km = element['distance']['value'] / 1000
+        hrs = element['duration']['value'] / 3600
+        conn.execute(
+            "INSERT OR REPLACE INTO dm VALUES(?,?,?,?,?)",
+            (origin_key, dest_key, km, hrs, int(time.time()))
+        )
+        conn.commit()
+        return km, hrs
+    except StopException:
+        raise
+    except Exception as e:
+        st.warning(f"Error calling Google Maps API: {e}")
+        return 0, 0
+
+def generate_pdf(data: dict) -> bytes:
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", 'B', 16)
+    pdf.cell(0, 10, "Vinyl Pool Estimate", ln=True, align="C")
+    pdf.ln(5)
+    pdf.set_font("Arial", '', 12)
+    # One multi_cell per section: fpdf re-checks font metrics and grows its
+    # buffer on every cell call, so batch the rows into a single string.
+    summary_text = "\n".join(f"{k}: {v}" for k, v in data['summary'].items())
+    pdf.multi_cell(0, 8, summary_text)
+    pdf.ln(5)
+    pdf.set_font("Arial", 'B', 14)
+    pdf.cell(0, 10, "Cost Breakdown", ln=True)
+    pdf.set_font("Arial", '', 12)
+    costs_text = "\n".join(f"{k}: ${v:,.2f}" for k, v in data['costs'].items())
+    pdf.multi_cell(0, 8, costs_text)
+    pdf.ln(5)
+    pdf.set_font("Arial", 'B', 14)
+    total = data['costs'].get("Total", 0)
+    pdf.cell(0, 10, f"Total Estimated Build Cost: ${total:,.2f}", ln=True)
+    return pdf.output(dest='S').encode('latin-1')
+
+# Authenticated SMTP client shared across sends: the TCP + TLS + AUTH
+# handshake to Gmail costs roughly a second, so pay it once per credentials.
+@st.cache_resource(show_spinner=False)
+def _smtp(sender_email, sender_password):
+    server = smtplib.SMTP("smtp.gmail.com", 587)
+    server.starttls()
+    server.login(sender_email, sender_password)
+    return server
+
+def send_email_with_attachment(sender_email, sender_password, recipient_email, subject, body, attachment_bytes, attachment_name):
+    msg = EmailMessage()
+    msg['From'] = sender_email
+    msg['To'] = recipient_email
+    msg['Subject'] = subject
+    msg.set_content(body)
+    msg.add_attachment(attachment_bytes, maintype='application', subtype='pdf', filename=attachment_name)
+
+    try:
+        try:
+            _smtp(sender_email, sender_password).send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # Stale cached connection (Gmail drops idle sessions) — reconnect once.
+            _smtp.clear()
+            _smtp(sender_email, sender_password).send_message(msg)
+        return True, "Email sent successfully."
+    except Exception as e:
+        return False, f"Failed to send email: {e}"
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def compute_estimate(address, width, length, dist_to_pool, access_in, steps, tracking, lights, selected_pump, selected_heater):
+    # All pricing for one estimate. Cached on the form inputs so Streamlit
+    # reruns triggered by unrelated widgets return instantly. The PDF is
+    # rendered separately, and only when the user asks for it.
+    linear_feet = 2 * (width + length)
+    sqft = width * length
+    category = 'Small' if linear_feet <= 76 else 'Medium' if linear_feet <= 104 else 'Large'
+    difficulty = calculate_difficulty(dist_to_pool, access_in)
+    permit_cost = get_permit_cost(address)
+    drive_km, drive_hr = get_drive_km_and_time(_origin_latlng(), address)
+    drive_cost = drive_hr * 35 * 26 * 4  # labor cost estimate
+
+    exc, pool_work, liner = COST_TABLE[(category, difficulty)]
+    base_liner = INSTALL_COST[category]
+    hpb, steel, extra_base = linear_feet * _LF_COEF
+    concrete, soft, winter_area = sqft * _SQFT_COEF
+    extra = extra_base + _STEP_EXTRA[steps]
+    # Round up to the next 10 ft; ceil to whole feet first so fractional
+    # footage (e.g. 70.6 ft) still bumps to the next increment.
+    rounded = -(-math.ceil(linear_feet) // 10) * 10
+    tracking_cost = rounded * _TRACK_RATE[tracking]
+    lights_total = lights * 366.65
+    transformer = _TRANSFORMER if lights > 0 else 0
+
+    pump_cost = PUMP_OPTIONS[selected_pump]
+    heater_cost = HEATER_OPTIONS[selected_heater]
+
+    total = (
+        _FIXED_SUM
+        + exc + pool_work + liner
+        + base_liner + extra + hpb + steel + tracking_cost
+        + concrete + soft
+        + lights_total + transformer
+        + heater_cost + pump_cost
+        + winter_area
+        + permit_cost + drive_cost
+    )
+
+    summary = {
+        "Address": address,
+        "Pool Size": f"{width} x {length} ft",
+        "Linear Feet": f"{linear_feet:.0f}",
+        "Square Ft": f"{sqft:.0f}",
+        "Category": category,
+        "Difficulty": difficulty,
+        "City": get_city(address).title(),
+        "Fibreglass Steps": steps,
+        "Tracking Type": tracking,
+        "Lights": lights,
+        "Pump Model": selected_pump,
+        "Heater Model": selected_heater,
+        "Drive Distance": f"{drive_km:.2f} km",
+        "Drive Time": f"{drive_hr*60:.0f} min"
+    }
+
+    breakdown = {
+        "Excavation": exc,
+        "Pool Work": pool_work,
+        "Liner Labor": liner,
+        "Liner Material + Steps": base_liner + extra,
+        "HPB": hpb,
+        "Steel": steel,
+        "Tracking": tracking_cost,
+        "Concrete": concrete,
+        "Softbottom": soft,
+        "Lights": lights_total,
+        "Transformer": transformer,
+        "Drain Kit": _DRAIN_KIT,
+        "Plumbing": _PLUMBING,
+        "Heater": heater_cost,
+        "Filter": _FILTER,
+        "Pump": pump_cost,
+        "Salt System (+salt)": _SALT_SYSTEM,
+        "Winter Cover Area": winter_area,
+        "Winter Cover Labour": _WINTER_LABOUR,
+        "Permit": permit_cost,
+        "Drive Time Labour": drive_cost,
+        "Total": total
+    }
+
+    return summary, breakdown